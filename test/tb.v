@@ -1,4 +1,4 @@
-`default_nettype none `timescale 1ns / 100ps
+`default_nettype none `timescale 1ns / 1ps
 
 /* This testbench just instantiates the module and makes some convenient wires
    that can be driven / tested by the cocotb test.py.
@@ -33,10 +33,53 @@ module tb ();
   wire spi_mosi = uo_out[3];
   wire spi_dc = uo_out[2];
 
+  // 64MHz clock
+  initial begin
+    clk = 0;
+    forever #7.812 clk = ~clk;
+  end
+
+  // Gamepad PMOD shifter, so a whole controller word can be clocked out
+  // without driving every edge from the cocotb test.
+  // Set game_shift_word, raise game_shift_start and wait for game_shift_done.
+  // If game_shift_do_latch is set the latch is pulsed after the last bit.
+  localparam GAME_HALF_BIT = 5000;  // 5us
+  reg [23:0] game_shift_word;
+  reg game_shift_start;
+  reg game_shift_do_latch;
+  reg game_shift_done;
+  reg game_shift_clk;
+  reg game_shift_data;
+  reg game_shift_latch;
+  integer game_shift_i;
+
+  initial begin
+    game_shift_start = 0;
+    game_shift_done = 0;
+    game_shift_clk = 0;
+    game_shift_data = 0;
+    game_shift_latch = 0;
+  end
+
+  always @(posedge game_shift_start) begin
+    game_shift_done = 0;
+    for (game_shift_i = 23; game_shift_i >= 0; game_shift_i = game_shift_i - 1) begin
+      game_shift_data = game_shift_word[game_shift_i];
+      #GAME_HALF_BIT game_shift_clk = 1;
+      #GAME_HALF_BIT game_shift_clk = 0;
+    end
+    #GAME_HALF_BIT;
+    if (game_shift_do_latch) begin
+      game_shift_latch = 1;
+      #GAME_HALF_BIT game_shift_latch = 0;
+    end
+    game_shift_done = 1;
+  end
+
   wire mhz_clk = ui_in_base[3];
-  wire game_latch = ui_in_base[4];
-  wire game_clk = ui_in_base[5];
-  wire game_data = ui_in_base[6];
+  wire game_latch = ui_in_base[4] | game_shift_latch;
+  wire game_clk = ui_in_base[5] | game_shift_clk;
+  wire game_data = ui_in_base[6] | game_shift_data;
 
   wire uart_tx = uo_out[0];
   wire uart_rts = uo_out[1];
@@ -44,6 +87,40 @@ module tb ();
   wire uart_rx = ui_in_base[7];
   assign ui_in = {uart_rx, game_data, game_clk, game_latch, mhz_clk, spi_miso, ui_in_base[1:0]};
 
+  // Cycle countdown, so a test can wait for a number of clocks with a
+  // single trigger: set settle_cnt and wait for settle_done to rise.
+  reg [7:0] settle_cnt;
+  wire settle_done = (settle_cnt == 0);
+
+  initial settle_cnt = 0;
+
+  always @(posedge clk) begin
+    if (settle_cnt != 0) settle_cnt <= settle_cnt - 1;
+  end
+
+  // PWM sampler for the simple_pwm test: while pwm_sample_en is high, count
+  // how many of the next 255 cycles have uo_out[0] high, and flag any cycle
+  // where the outputs are not all equal.
+  reg pwm_sample_en;
+  reg [8:0] pwm_sum;
+  reg [7:0] pwm_cnt;
+  reg pwm_error;
+  wire pwm_sample_done = (pwm_cnt == 8'd255);
+
+  initial pwm_sample_en = 0;
+
+  always @(posedge clk) begin
+    if (!pwm_sample_en) begin
+      pwm_sum <= 0;
+      pwm_cnt <= 0;
+      pwm_error <= 0;
+    end else if (!pwm_sample_done) begin
+      pwm_sum <= pwm_sum + uo_out[0];
+      pwm_cnt <= pwm_cnt + 1;
+      if (uo_out !== 8'hff && uo_out !== 8'h00) pwm_error <= 1;
+    end
+  end
+
 `ifdef GL_TEST
   wire VPWR = 1'b1;
   wire VGND = 1'b0;
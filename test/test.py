@@ -20,9 +20,6 @@ from test_util import reset, start_read, send_instr, start_nops, stop_nops, read
 async def test_start(dut):
   dut._log.info("Start")
   
-  clock = Clock(dut.clk, 15.624, units="ns")
-  cocotb.start_soon(clock.start())
-
   # Reset
   await reset(dut)
   
@@ -186,9 +183,6 @@ async def test_start(dut):
 async def test_timer(dut):
     dut._log.info("Start")
 
-    clock = Clock(dut.clk, 15.624, units="ns")
-    cocotb.start_soon(clock.start())
-
     mhz_clock = Clock(dut.mhz_clk, 1000, units="ns")
     cocotb.start_soon(mhz_clock.start())
 
@@ -240,9 +234,6 @@ async def test_timer(dut):
 async def test_debug_reg(dut):
   dut._log.info("Start")
   
-  clock = Clock(dut.clk, 15.624, units="ns")
-  cocotb.start_soon(clock.start())
-
   # Reset
   await reset(dut, 1, 0x3)
   
@@ -273,9 +264,6 @@ async def test_debug_reg(dut):
 async def test_load_bug(dut):
   dut._log.info("Start")
   
-  clock = Clock(dut.clk, 15.624, units="ns")
-  cocotb.start_soon(clock.start())
-
   # Reset
   await reset(dut)
 
@@ -534,9 +522,6 @@ ops_alu = [
 async def test_random_alu(dut):
     dut._log.info("Start")
   
-    clock = Clock(dut.clk, 15.624, units="ns")
-    cocotb.start_soon(clock.start())
-
     # Reset
     await reset(dut)
 
@@ -829,9 +814,6 @@ ops = [
 async def test_random(dut):
     dut._log.info("Start")
   
-    clock = Clock(dut.clk, 15.624, units="ns")
-    cocotb.start_soon(clock.start())
-
     # Reset
     await reset(dut)
 
@@ -1,3 +1,4 @@
+import functools
 import random
 
 import cocotb
@@ -5,7 +6,7 @@ from cocotb.triggers import ClockCycles, Timer
 
 from riscvmodel.insn import *
 
-from riscvmodel.regnames import x0, gp, tp, a0
+from riscvmodel.regnames import x0, gp, tp, a0, a1
 
 
 async def reset(dut, latency=1, ui_in=0x80):
@@ -138,27 +139,54 @@ async def start_write(dut, addr):
 
 nibble_shift_order = [4, 0, 12, 8, 20, 16, 28, 24]
 
+# Compressed instruction encodings, which riscvmodel can't produce.
+# These only take 4 nibbles to send, instead of 8 for the full instruction.
+def encode_cli(rd, imm):
+    assert -32 <= imm < 32
+    return 0x4001 | ((imm & 0x20) << 7) | (rd << 7) | ((imm & 0x1f) << 2)
+
+def encode_cmem(funct, reg, base_reg, offset):
+    assert 8 <= reg < 16 and 8 <= base_reg < 16
+    assert 0 <= offset < 128 and (offset & 3) == 0
+    return (funct | ((offset & 0x38) << 7) | ((base_reg - 8) << 7) |
+            ((offset & 0x4) << 4) | ((offset & 0x40) >> 1) | ((reg - 8) << 2))
+
+def encode_clw(rd, base_reg, offset):
+    return encode_cmem(0x4000, rd, base_reg, offset)
+
+def encode_csw(base_reg, rs, offset):
+    return encode_cmem(0xC000, rs, base_reg, offset)
+
 async def send_instr(dut, data, ok_to_exit=False):
+    # Look up the handles once, this is called for every instruction
+    clk = dut.clk
+    data_in = dut.qspi_data_in
+    data_oe = dut.qspi_data_oe
+    clk_out = dut.qspi_clk_out
+    flash_select = dut.qspi_flash_select
+
     instr_len = 8 if (data & 3) == 3 else 4
     for i in range(instr_len):
-        dut.qspi_data_in.value = (data >> (nibble_shift_order[i])) & 0xF
-        await ClockCycles(dut.clk, 1, False)
+        data_in.value = (data >> (nibble_shift_order[i])) & 0xF
+        await ClockCycles(clk, 1, False)
         for _ in range(20):
-            if ok_to_exit and dut.qspi_flash_select.value == 1:
+            select = flash_select.value.integer
+            if ok_to_exit and select == 1:
                 return
-            assert dut.qspi_flash_select.value == 0
-            if dut.qspi_clk_out.value == 0:
-                await ClockCycles(dut.clk, 1, False)
+            assert select == 0
+            if clk_out.value.integer == 0:
+                await ClockCycles(clk, 1, False)
             else:
                 break
-        assert dut.qspi_clk_out.value == 1
-        assert dut.qspi_data_oe.value == 0
-        await ClockCycles(dut.clk, 1, False)
-        assert dut.qspi_clk_out.value == 0
+        assert clk_out.value.integer == 1
+        assert data_oe.value.integer == 0
+        await ClockCycles(clk, 1, False)
+        assert clk_out.value.integer == 0
         if i != instr_len - 1:
-            if ok_to_exit and dut.qspi_flash_select.value == 1:
+            select = flash_select.value.integer
+            if ok_to_exit and select == 1:
                 return
-            assert dut.qspi_flash_select.value == 0
+            assert select == 0
 
 async def expect_load(dut, addr, val, bytes=4):
     if addr >= 0x1800000:
@@ -207,23 +235,34 @@ async def load_reg(dut, reg, value):
     await expect_load(dut, 0x1000400 + offset, value)
 
 
+NOP_INSTR = InstructionADDI(x0, x0, 0).encode()
+
 send_nops = True
 nop_task = None
+nops_sent = 0
 
-async def nops_loop(dut):
+async def nops_loop(dut, ok_to_exit=False):
+    global nops_sent
     while send_nops:
-        await send_instr(dut, InstructionADDI(x0, x0, 0).encode())
+        nops_sent += 1
+        await send_instr(dut, NOP_INSTR, ok_to_exit)
 
-def start_nops(dut):
-    global send_nops, nop_task
+def start_nops(dut, ok_to_exit=False):
+    global send_nops, nop_task, nops_sent
     send_nops = True
-    nop_task = cocotb.start_soon(nops_loop(dut))
+    nops_sent = 0
+    nop_task = cocotb.start_soon(nops_loop(dut, ok_to_exit))
 
 async def stop_nops():
     global send_nops, nop_task
     send_nops = False
     await nop_task
 
+# Triggers are reusable, so create the debug UART timers once
+debug_uart_poll = Timer(5, "ns")
+debug_uart_half_bit = Timer(125, "ns")
+debug_uart_bit = Timer(250, "ns")
+
 async def read_byte(dut, reg, expected_val):
   await send_instr(dut, InstructionSW(tp, reg, 0x18).encode())
 
@@ -232,16 +271,15 @@ async def read_byte(dut, reg, expected_val):
       if dut.debug_uart_tx.value == 0:
           break
       else:
-          await Timer(5, "ns")
+          await debug_uart_poll
   assert dut.debug_uart_tx.value == 0
-  bit_time = 250
-  await Timer(bit_time / 2, "ns")
+  await debug_uart_half_bit
   assert dut.debug_uart_tx.value == 0
   for i in range(8):
-      await Timer(bit_time, "ns")
+      await debug_uart_bit
       assert dut.debug_uart_tx.value == (expected_val & 1)
       expected_val >>= 1
-  await Timer(bit_time, "ns")
+  await debug_uart_bit
   assert dut.debug_uart_tx.value == 1
 
   await stop_nops()
@@ -298,8 +336,57 @@ async def read_reg(dut, reg):
     return await expect_store(dut, 0x1000400 + offset)
 
 async def set_all_outputs_to_peripheral(dut, peripheral_num):
+    if hasattr(dut.user_project, "i_peripherals"):
+        # In RTL simulation, deposit the output selection directly
+        # instead of executing a store for each output
+        dut.user_project.gpio_out_sel.value = 0b11
+        for i in range(8):
+            dut.user_project.i_peripherals.gpio_out_func_sel[i].value = peripheral_num
+        return
+
     await send_instr(dut, InstructionADDI(a0, x0, 0xc0).encode())
     await send_instr(dut, InstructionSW(tp, a0, 0xc).encode())
     await send_instr(dut, InstructionADDI(a0, x0, peripheral_num).encode())
     for func_sel in range(0x60, 0x80, 4):
         await send_instr(dut, InstructionSW(tp, a0, func_sel).encode())
+
+@functools.lru_cache(maxsize=256)
+def set_a1_instr(value):
+    if -32 <= value < 32:
+        return encode_cli(a1, value)
+    return InstructionADDI(a1, x0, value).encode()
+
+class PeripheralRegs:
+    # Register access for a peripheral, using a0 for its base address and
+    # a1 for the value.  Tracks what a0 and a1 hold so the setup instructions
+    # are only sent when needed: call forget() after anything else writes them.
+    # store_instr and load_instr encode the peripheral's access instructions,
+    # all encodings are cached so they aren't redone on every access.
+    def __init__(self, dut, base_address, store_instr, load_instr):
+        self.dut = dut
+        self.set_base_instr = InstructionADDI(a0, tp, base_address).encode()
+        self.store_instr = functools.lru_cache(maxsize=256)(store_instr)
+        self.load_instr = functools.lru_cache(maxsize=256)(load_instr)
+        self.forget()
+
+    def forget(self):
+        self.a0_is_base = False
+        self.a1_value = None
+
+    async def set_base(self):
+        if not self.a0_is_base:
+            await send_instr(self.dut, self.set_base_instr)
+            self.a0_is_base = True
+
+    async def write_reg(self, reg, value):
+        await self.set_base()
+        if self.a1_value != value:
+            await send_instr(self.dut, set_a1_instr(value))
+            self.a1_value = value
+        await send_instr(self.dut, self.store_instr(reg))
+
+    async def read_reg(self, reg):
+        await self.set_base()
+        await send_instr(self.dut, self.load_instr(reg))
+        self.a1_value = await read_reg(self.dut, a1)
+        return self.a1_value
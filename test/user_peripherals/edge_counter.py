@@ -2,7 +2,6 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import cocotb
-from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles
 
 from riscvmodel.insn import *
@@ -23,24 +22,16 @@ EDGE_NONE = 0
 EDGE_RISING = 1
 EDGE_FALLING = 2
 
-async def write_reg(dut, reg, value):
-    await tqv.send_instr(dut, InstructionADDI(a0, tp, BASE_ADDRESS).encode())
-    await tqv.send_instr(dut, InstructionADDI(a1, x0, value).encode())
-    await tqv.send_instr(dut, InstructionSB(a0, a1, reg).encode())
+def store_instr(reg):
+    return InstructionSB(a0, a1, reg).encode()
 
-
-async def read_reg(dut, reg):
-    await tqv.send_instr(dut, InstructionADDI(a0, tp, BASE_ADDRESS).encode())
-    await tqv.send_instr(dut, InstructionLBU(a1, a0, reg).encode())
-    return await tqv.read_reg(dut, a1)
+def load_instr(reg):
+    return InstructionLBU(a1, a0, reg).encode()
 
 @cocotb.test()
 async def test_project(dut):
     dut._log.info("Start")
     
-    clock = Clock(dut.clk, 15.624, units="ns")
-    cocotb.start_soon(clock.start())
-
     # Reset
     await tqv.reset(dut)
     
@@ -52,54 +43,51 @@ async def test_project(dut):
 
     # Set all outputs to edge detector
     await tqv.set_all_outputs_to_peripheral(dut, PERIPHERAL_NUM)
+    regs = tqv.PeripheralRegs(dut, BASE_ADDRESS, store_instr, load_instr)
 
     # Set the input values you want to test
-    await write_reg(dut, REG_RESET, 0)
-    await write_reg(dut, REG_INC, 1)
-    await write_reg(dut, REG_INC, 1)
-    await write_reg(dut, REG_INC, 1)
-    value = await read_reg(dut, REG_VALUE)
+    await regs.write_reg(REG_RESET, 0)
+    await regs.write_reg(REG_INC, 1)
+    await regs.write_reg(REG_INC, 1)
+    await regs.write_reg(REG_INC, 1)
+    value = await regs.read_reg(REG_VALUE)
     assert value == 3
 
     dut._log.info("Test seven segment display")
     assert dut.uo_out.value == 0b01001111  # 3 encoded for seven segment display
 
     dut._log.info("Test rising edge detection")
-    await write_reg(dut, REG_CFG, EDGE_RISING)
-    await write_reg(dut, REG_RESET, 0)
-    value = await read_reg(dut, REG_VALUE)
-    dut.ui_in.value = 0x01
-    #await ClockCycles(dut.clk, 20)
-    value = await read_reg(dut, REG_VALUE)
+    await regs.write_reg(REG_CFG, EDGE_RISING)
+    await regs.write_reg(REG_RESET, 0)
+    # Let the reset complete before changing the input
+    await tqv.send_instr(dut, tqv.NOP_INSTR)
+    dut.ui_in.setimmediatevalue(0x01)
+    value = await regs.read_reg(REG_VALUE)
     assert value == 1
 
-    dut.ui_in.value = 0x00
-    #await ClockCycles(dut.clk, 10)
-    value = await read_reg(dut, REG_VALUE)
+    dut.ui_in.setimmediatevalue(0x00)
+    value = await regs.read_reg(REG_VALUE)
     assert value == 1
 
-    dut.ui_in.value = 0x01
-    #await ClockCycles(dut.clk, 1)
-    value = await read_reg(dut, REG_VALUE)
+    dut.ui_in.setimmediatevalue(0x01)
+    value = await regs.read_reg(REG_VALUE)
     assert value == 2
 
     dut._log.info("Test falling edge detection")
-    await write_reg(dut, REG_CFG, EDGE_FALLING)
-    await write_reg(dut, REG_RESET, 0)
-    value = await read_reg(dut, REG_VALUE)
-    dut.ui_in.value = 0x00
-    #await ClockCycles(dut.clk, 10)
-    value = await read_reg(dut, REG_VALUE)
+    await regs.write_reg(REG_CFG, EDGE_FALLING)
+    await regs.write_reg(REG_RESET, 0)
+    # Let the reset complete before changing the input
+    await tqv.send_instr(dut, tqv.NOP_INSTR)
+    dut.ui_in.setimmediatevalue(0x00)
+    value = await regs.read_reg(REG_VALUE)
     assert value == 1
 
-    dut.ui_in.value = 0x01
-    #await ClockCycles(dut.clk, 1)
-    value = await read_reg(dut, REG_VALUE)
+    dut.ui_in.setimmediatevalue(0x01)
+    value = await regs.read_reg(REG_VALUE)
     assert value == 1
 
-    dut.ui_in.value = 0x00
-    #await ClockCycles(dut.clk, 10)
-    value = await read_reg(dut, REG_VALUE)
+    dut.ui_in.setimmediatevalue(0x00)
+    value = await regs.read_reg(REG_VALUE)
     assert value == 2
 
     assert dut.uo_out.value == 0b01011011  # 2 encoded for seven segment display
@@ -2,8 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import cocotb
-from cocotb.clock import Clock
-from cocotb.triggers import ClockCycles
+from cocotb.triggers import ClockCycles, RisingEdge, ReadOnly
 
 from riscvmodel.insn import *
 
@@ -17,24 +16,16 @@ PERIPHERAL_NUM = 17
 REG_LEVEL = 0x00
 REG_COUNT = 0x01
 
-async def write_reg(dut, reg, value):
-    await tqv.send_instr(dut, InstructionADDI(a0, tp, BASE_ADDRESS).encode())
-    await tqv.send_instr(dut, InstructionADDI(a1, x0, value).encode())
-    await tqv.send_instr(dut, InstructionSB(a0, a1, reg).encode())
+def store_instr(reg):
+    return InstructionSB(a0, a1, reg).encode()
 
-
-async def read_reg(dut, reg):
-    await tqv.send_instr(dut, InstructionADDI(a0, tp, BASE_ADDRESS).encode())
-    await tqv.send_instr(dut, InstructionLBU(a1, a0, reg).encode())
-    return await tqv.read_reg(dut, a1)
+def load_instr(reg):
+    return InstructionLBU(a1, a0, reg).encode()
 
 @cocotb.test()
 async def test_project(dut):
     dut._log.info("Start")
     
-    clock = Clock(dut.clk, 15.624, units="ns")
-    cocotb.start_soon(clock.start())
-
     # Reset
     await tqv.reset(dut)
     
@@ -46,32 +37,34 @@ async def test_project(dut):
 
     # Set all outputs to PWM
     await tqv.set_all_outputs_to_peripheral(dut, PERIPHERAL_NUM)
+    regs = tqv.PeripheralRegs(dut, BASE_ADDRESS, store_instr, load_instr)
 
     # Set the input values you want to test
-    await write_reg(dut, REG_LEVEL, 128)
-    value = await read_reg(dut, REG_LEVEL)
+    await regs.write_reg(REG_LEVEL, 128)
+    value = await regs.read_reg(REG_LEVEL)
     assert value == 128
 
     # Counter should count up
-    value1 = await read_reg(dut, REG_COUNT)
-    value2 = await read_reg(dut, REG_COUNT)
+    value1 = await regs.read_reg(REG_COUNT)
+    value2 = await regs.read_reg(REG_COUNT)
 
     if value2 < value1: value2 += 255
     assert value2 - value1 > 90
     assert value2 - value1 < 160
 
     for level in (0, 1, 66, 128, 203, 255):
-        await write_reg(dut, REG_LEVEL, level)
+        await regs.write_reg(REG_LEVEL, level)
 
         tqv.start_nops(dut)
-        await ClockCycles(dut.clk, 24)
-            
-        count = 0
-        for i in range(255):
-            count += dut.uo_out.value & 1
-            assert dut.uo_out.value == 0xff or dut.uo_out.value == 0
-            await ClockCycles(dut.clk, 1)
+        dut.settle_cnt.value = 24
+        await RisingEdge(dut.settle_done)
 
-        assert count == level
+        # The testbench counts the high cycles over one PWM period
+        dut.pwm_sample_en.value = 1
+        await RisingEdge(dut.pwm_sample_done)
+        await ReadOnly()
+        assert dut.pwm_error.value.integer == 0
+        assert dut.pwm_sum.value.integer == level
 
         await tqv.stop_nops()
+        dut.pwm_sample_en.value = 0